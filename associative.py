@@ -15,18 +15,156 @@
 
 # File originally create by Raul Peralta-Lozada.
 
+from collections import namedtuple
+from joblib import Parallel, delayed, effective_n_jobs
+from multiprocessing import shared_memory
 import numpy as np
-import random
 import time
 
 import constants
 
+# Number of bits in a word of a packed relation.
+word_size = 64
+
+# Time stamp of cells that have never been registered.
+never = np.iinfo(np.int64).max
+
+# Number of set bits of every byte value.
+_byte_popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    """Return the number of set bits of every element of an array of words."""
+    words = np.ascontiguousarray(words)
+    bytes_ = words.view(np.uint8).reshape(words.shape + (words.itemsize, ))
+    return _byte_popcount[bytes_].sum(axis=-1, dtype=np.int64)
+
+
+def pack_bits(bits):
+    """Pack the last axis of a boolean array as uint64 words.
+
+    Bit j is stored in bit j % 64 of word j // 64.
+    """
+    count = bits.shape[-1]
+    n_words = -(-count // word_size)
+    bytes_ = np.zeros(bits.shape[:-1] + (n_words*word_size // 8, ), dtype=np.uint8)
+    bytes_[..., :-(-count // 8)] = np.packbits(bits, axis=-1, bitorder='little')
+    return bytes_.view('<u8').astype(np.uint64)
+
+
+def unpack_bits(words, count):
+    """Inverse of pack_bits, returns the first count bits of the words."""
+    bytes_ = np.ascontiguousarray(words, dtype='<u8').view(np.uint8)
+    bits = np.unpackbits(bytes_, axis=-1, count=count, bitorder='little')
+    return bits.astype(np.bool)
+
+
+def pack_columns(relation):
+    """Pack an (m, n) boolean relation as n columns of uint64 words."""
+    return pack_bits(relation.T)
+
+
+def unpack_columns(words, m):
+    """Inverse of pack_columns, returns an (m, n) boolean relation."""
+    return unpack_bits(words, m).T
+
+
 class AssociativeMemoryError(Exception):
     pass
 
 
+# Marked cells of a relation, column by column.
+#
+# rows: marked rows, sorted by column and then by row.
+# keys: column*m + row of the same cells, in the same order.
+# offsets: the marked rows of column i are rows[offsets[i]:offsets[i+1]].
+# run_of: index of the run of marked cells each marked cell belongs to.
+# starts, ends: first and last rows of each run, sorted as the cells.
+# run_offsets: the runs of column i are starts[run_offsets[i]:run_offsets[i+1]].
+RunIndex = namedtuple('RunIndex',
+    ['rows', 'keys', 'offsets', 'run_of', 'starts', 'ends', 'run_offsets'])
+
+
+# Saved memories and banks are a header followed by their arrays, each
+# array starting at a multiple of _alignment bytes.
+_magic = b'EAMEMORY'
+_version = 1
+_alignment = 64
+_memory_kind = 0
+_bank_kind = 1
+_header = np.dtype([('magic', 'S8'), ('version', '<u4'), ('kind', '<u4'),
+    ('n_memories', '<i8'), ('n', '<i8'), ('m', '<i8'), ('tolerance', '<i8'),
+    ('registrations', '<i8'), ('packed', 'u1'), ('counting', 'u1'), ('timestamped', 'u1')])
+
+
+def _aligned(offset):
+    return -(-offset // _alignment) * _alignment
+
+
+def _new_header(kind, n_memories, n, m, tolerance, registrations, packed, counting, timestamped):
+    return np.array([(_magic, _version, kind, n_memories, n, m, tolerance,
+        registrations, packed, counting, timestamped)], dtype=_header)
+
+
+def _write(filename, header, arrays):
+    with open(filename, 'wb') as f:
+        header.tofile(f)
+        for array in arrays:
+            f.write(bytes(_aligned(f.tell()) - f.tell()))
+            np.ascontiguousarray(array).tofile(f)
+
+
+def _checked_header(header, kind, source):
+    if (len(header) == 0 or header['magic'][0] != _magic
+            or header['version'][0] != _version or header['kind'][0] != kind):
+        raise AssociativeMemoryError('Not a saved ' + ('bank' if kind == _bank_kind else 'memory'), source)
+    return header[0]
+
+
+def _read_header(filename, kind):
+    return _checked_header(np.fromfile(filename, dtype=_header, count=1), kind, filename)
+
+
+def _offsets(specs):
+    """Offsets of arrays of the given (dtype, shape) laid out after a header, and the total size."""
+    offsets = []
+    size = _header.itemsize
+    for dtype, shape in specs:
+        offsets.append(_aligned(size))
+        size = offsets[-1] + np.dtype(dtype).itemsize*int(np.prod(shape))
+    return offsets, size
+
+
+def _read_arrays(filename, specs, mmap_mode):
+    """Read arrays of the given (dtype, shape) from filename, in order.
+
+    They are mapped with numpy.memmap in mmap_mode, or read into memory
+    if it is None.
+    """
+    arrays = []
+    for (dtype, shape), offset in zip(specs, _offsets(specs)[0]):
+        if mmap_mode is None:
+            array = np.fromfile(filename, dtype=dtype, count=int(np.prod(shape)),
+                offset=offset).reshape(shape)
+        else:
+            array = np.memmap(filename, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape)
+        arrays.append(array)
+    return arrays
+
+
+def _open_shared(name):
+    """Attach to an existing shared memory segment, leaving its removal to its creator."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Before Python 3.13 it is registered again with the resource
+        # tracker, which child processes share with their parent.
+        return shared_memory.SharedMemory(name)
+
+
 class AssociativeMemory(object):
-    def __init__(self, n: int, m: int, tolerance = 0):
+    def __init__(self, n: int, m: int, tolerance = 0, packed = False, counting = False,
+            timestamped = False, rng = None):
         """
         Parameters
         ----------
@@ -34,10 +172,31 @@ class AssociativeMemory(object):
             The size of the domain (of properties).
         m : int
             The size of the range (of representation).
+        packed : bool
+            Store each column of the relation as bits of uint64 words,
+            instead of one byte per cell.
+        counting : bool
+            Keep how many times each cell has been registered, so vectors
+            can be unregistered.
+        timestamped : bool
+            Keep the index of the first registration that marked each cell,
+            so the memory can be queried as it was after any number of
+            registrations.
+        rng : None, int, SeedSequence or Generator
+            Source of the random choices made when recalling, as taken by
+            numpy.random.default_rng.
         """
         self.n = n
         self.m = m
         self.t = tolerance
+        self._packed = packed
+        self._counting = counting
+        self._timestamped = timestamped
+        self._clock = 0
+        self.rng = np.random.default_rng(rng)
+        self._columns = np.arange(self.n)
+        # The bank this memory is a view on, if any.
+        self._bank = None
 
         # it is m+1 to handle partial functions.
         self.relation = np.zeros((self.m, self.n), dtype=np.bool)
@@ -72,8 +231,45 @@ class AssociativeMemory(object):
         else:
             raise ValueError('Invalid value for m.')
 
+    @property
+    def packed(self):
+        return self._packed
+
+    @property
+    def counting(self):
+        return self._counting
+
+    @property
+    def counts(self):
+        """Registrations per cell of a counting memory, None otherwise."""
+        return self._counts if self.counting else None
+
+    @property
+    def timestamped(self):
+        return self._timestamped
+
+    @property
+    def stamps(self):
+        """First registration marking each cell of a timestamped memory, None otherwise.
+
+        Cells never marked hold the value never.
+        """
+        return self._stamps if self.timestamped else None
+
+    @property
+    def registrations(self):
+        """Number of registrations (and abstractions) so far."""
+        return self._clock
+
     @property
     def relation(self):
+        """The (m, n) boolean relation.
+
+        For packed memories it is unpacked on every access, so changes to
+        the returned array do not affect the memory.
+        """
+        if self.packed:
+            return unpack_columns(self._words, self.m)
         return self._relation
 
     @relation.setter
@@ -81,20 +277,32 @@ class AssociativeMemory(object):
         if (isinstance(new_relation, np.ndarray) and
                 new_relation.dtype == np.bool and
                 new_relation.shape == (self.m, self.n)):
-            self._relation = new_relation
+            if self.packed:
+                self._words = pack_columns(new_relation)
+            else:
+                self._relation = new_relation
+            if self.counting:
+                # Each marked cell counts as registered once.
+                self._counts = new_relation.astype(np.uint32)
+            if self.timestamped:
+                # As if marked by a registration before any other.
+                self._stamps = np.where(new_relation, 0, never)
+            self._count_columns()
         else:
             raise ValueError('Invalid relation assignment.')
 
+    @property
+    def column_counts(self):
+        """Number of marked cells in each column, kept up to date on registration."""
+        return self._column_counts
+
     @property
     def entropy(self) -> float:
         """Return the entropy of the Associative Memory."""
-        e = 0.0  # entropy
-        v = self.relation.sum(axis=0)  # number of marked cells in the columns
-        for vi in v:
-            if vi != 0:
-                e += np.log2(1.0 / vi)
-        e *= (-1.0 / self.n)
-        return e
+        if self._entropy is None:
+            v = self.column_counts  # number of marked cells in the columns
+            self._entropy = np.log2(v[v != 0]).sum() / self.n
+        return self._entropy
 
     # @classmethod
     # def from_relation(cls, relation: np.ndarray) -> 'AssociativeMemory':
@@ -112,65 +320,186 @@ class AssociativeMemory(object):
 
 
     def vector_to_relation(self, vector):
+        self.validate(vector)
         relation = np.zeros((self.m, self.n), np.bool)
-        try:
-            relation[vector, range(self.n)] = True
-        except:
-            pass
+        relation[np.ravel(vector), self._columns] = True
         return relation
 
 
+    def _invalidate(self):
+        """Drop everything derived from the relation, as it has changed."""
+        self._entropy = None
+        self._run_index = None
+        if self._bank is not None:
+            self._bank._invalidate()
+
+
+    def _count_columns(self):
+        if self.packed:
+            self._column_counts = popcount(self._words).sum(axis=1)
+        else:
+            self._column_counts = np.count_nonzero(self._relation, axis=0)
+        self._invalidate()
+
+
+    @property
+    def run_index(self):
+        """The RunIndex of the relation, rebuilt after the relation changes."""
+        if self._run_index is None:
+            columns, rows = np.nonzero(self.relation.T)
+            # A run starts wherever a cell does not follow the previous
+            # one in the same column.
+            first = np.ones(len(rows), dtype=np.bool)
+            first[1:] = (columns[1:] != columns[:-1]) | (rows[1:] != rows[:-1] + 1)
+            last = np.ones(len(rows), dtype=np.bool)
+            last[:-1] = first[1:]
+
+            offsets = np.zeros(self.n + 1, dtype=int)
+            offsets[1:] = np.cumsum(self.column_counts)
+            run_offsets = np.zeros(self.n + 1, dtype=int)
+            run_offsets[1:] = np.cumsum(np.bincount(columns[first], minlength=self.n))
+
+            self._run_index = RunIndex(rows, columns*self.m + rows, offsets,
+                np.cumsum(first) - 1, rows[first], rows[last], run_offsets)
+        return self._run_index
+
+
+    def _marked(self, cues):
+        """Return whether cells (cues[..., i], i) are marked in the relation."""
+        columns = self._columns
+        if self.packed:
+            cues = cues.astype(np.int64)
+            words = self._words[columns, cues // word_size]
+            return ((words >> (cues % word_size).astype(np.uint64)) & np.uint64(1)).astype(np.bool)
+        return self.relation[cues, columns]
+
+
+    def _check_writeable(self):
+        # Checked before any change, as ufunc.at does not refuse read only
+        # arrays and cached counts would otherwise be left inconsistent.
+        if not (self._words if self.packed else self._relation).flags.writeable:
+            raise AssociativeMemoryError('The memory is read only.')
+        # Views would bypass the time stamps and registrations of the bank.
+        if self._bank is not None and (self._bank.timestamped or self._bank.name is not None):
+            raise AssociativeMemoryError('Memories of timestamped or shared banks are registered through the bank.')
+
+
+    def _mark(self, vectors):
+        """Mark cells (vectors[..., i], i) in the relation."""
+        self._check_writeable()
+        columns = self._columns
+        if vectors.ndim == 1:
+            # Columns are distinct, so every unmarked cell adds one.
+            self._column_counts = self._column_counts + ~self._marked(vectors)
+        if self.counting:
+            np.add.at(self._counts, (vectors, np.broadcast_to(columns, vectors.shape)), 1)
+        if self.timestamped:
+            clocks = self._clock + np.arange(vectors.size // self.n).reshape(vectors.shape[:-1] + (1, ))
+            np.minimum.at(self._stamps,
+                (vectors, np.broadcast_to(columns, vectors.shape)), clocks)
+        self._clock += vectors.size // self.n
+        if self.packed:
+            vectors = vectors.astype(np.int64)
+            bits = np.left_shift(np.uint64(1), (vectors % word_size).astype(np.uint64))
+            # Unbuffered, as several vectors may set bits of the same word.
+            np.bitwise_or.at(self._words,
+                (np.broadcast_to(columns, vectors.shape), vectors // word_size), bits)
+        else:
+            self.relation[vectors, columns] = True
+
+        if vectors.ndim == 1:
+            self._invalidate()
+        else:
+            self._count_columns()
+
+
     # Choose a value for feature i.
     def choose(self, i, v):
+        index = self.run_index
+        values = index.rows[index.offsets[i]:index.offsets[i+1]]
+
+        if self.is_undefined(v):
+            marked = False
+        else:
+            p = np.searchsorted(values, v)
+            marked = p < len(values) and values[p] == v
 
-        if self.is_undefined(v) or not self.relation[v,i]:
-            values = []
-            for j in range(self.m):
-                if self.relation[j,i]:
-                    values.append(j)
+        if not marked:
             if len(values) == 0:
                 return self.undefined
             else:
-                j = random.randrange(len(values))
+                j = self.rng.integers(len(values))
                 k = values[j]
                 return k
         else:
-            min = v
-            max = v
-
-            for j in range(v, -1, -1):
-                if self.relation[j,i]:
-                    min = j
-                else:
-                    break
-
-            for j in range(v, self.m):
-                if self.relation[j,i]:
-                    max = j
-                else:
-                    break
+            # The run holding v is the last one starting at or before it.
+            first = index.run_offsets[i]
+            r = first + np.searchsorted(index.starts[first:index.run_offsets[i+1]], v, 'right') - 1
+            min = index.starts[r]
+            max = index.ends[r]
 
             if min == max:
                 return v
             else:
-                k = round(random.triangular(min, max, v))
+                k = round(self.rng.triangular(min, v, max))
                 return k
                  
 
     def abstract(self, r_io) -> None:
-        self.relation = self.relation | r_io
+        self._check_writeable()
+        self._column_counts = self._column_counts + \
+            np.count_nonzero(r_io > self.relation, axis=0)
+        if self.counting:
+            self._counts += r_io
+        if self.timestamped:
+            np.minimum(self._stamps, np.where(r_io, self._clock, never), out=self._stamps)
+        self._clock += 1
+        if self.packed:
+            self._words |= pack_columns(r_io)
+        else:
+            self._relation |= r_io
+        self._invalidate()
 
 
     def containment(self, r_io):
-        return ~r_io | self.relation
+        if self.packed:
+            return unpack_columns(~pack_columns(r_io) | self._words, self.m)
+        contained = np.logical_not(r_io)
+        return np.logical_or(contained, self.relation, out=contained)
 
 
-    # Reduces a relation to a function
+    # Reduces a relation to a function, choosing the values of all
+    # features at once, with the same distribution used by choose.
     def lreduce(self, vector):
+        columns = self._columns
         v = np.full(self.n, self.undefined)
 
-        for i in range(self.n):
-            v[i] = self.choose(i, vector[i])
+        vector = np.asarray(vector)
+        defined = ~np.isnan(vector) if vector.dtype.kind == 'f' else np.ones(self.n, dtype=np.bool)
+        cues = np.where(defined, vector, 0).astype(int)
+        index = self.run_index
+
+        # Position of each cue cell among the marked cells, if it is marked.
+        keys = columns*self.m + cues
+        positions = np.minimum(np.searchsorted(index.keys, keys), len(index.keys) - 1)
+        hits = defined & (index.keys[positions] == keys) if len(index.keys) else \
+            np.zeros(self.n, dtype=np.bool)
+
+        # Marked cue: triangular between the ends of its run, peaking at the cue.
+        runs = index.run_of[positions[hits]]
+        lows = index.starts[runs]
+        highs = index.ends[runs]
+        chosen = cues[hits].astype(float)
+        spread = lows < highs
+        chosen[spread] = np.round(self.rng.triangular(
+            lows[spread], chosen[spread], highs[spread]))
+        v[hits] = chosen
+
+        # Otherwise any marked cell of the column, uniformly.
+        counts = self.column_counts
+        misses = ~hits & (counts > 0)
+        ranks = self.rng.integers(counts[misses])
+        v[misses] = index.rows[index.offsets[:-1][misses] + ranks]
 
         return v
 
@@ -179,8 +508,22 @@ class AssociativeMemory(object):
         if vector.size != self.n:
             raise ValueError('Invalid size of the input data. Expected', self.n, 'and given', vector.size)
 
-        if vector.max() > self.m or vector.min() < 0:
-            raise ValueError('Values in the input vector are invalid.')
+        if vector.dtype.kind not in 'iu':
+            raise ValueError('Values in the input vector must be integers, given', vector.dtype)
+
+        if vector.max() >= self.m or vector.min() < 0:
+            raise ValueError('Values in the input vector must be between 0 and', self.m - 1)
+
+
+    def validate_many(self, vectors):
+        if vectors.ndim != 2 or vectors.shape[1] != self.n:
+            raise ValueError('Invalid shape of the input data. Expected (N,', self.n, ') and given', vectors.shape)
+
+        if vectors.dtype.kind not in 'iu':
+            raise ValueError('Values in the input vectors must be integers, given', vectors.dtype)
+
+        if vectors.size and (vectors.max() >= self.m or vectors.min() < 0):
+            raise ValueError('Values in the input vectors must be between 0 and', self.m - 1)
 
 
     def register(self, vector) -> None:
@@ -188,23 +531,203 @@ class AssociativeMemory(object):
         vector = np.ravel(vector)
 
         self.validate(vector)
+        self._mark(vector)
+
+
+    def register_many(self, vectors) -> None:
+        """Register all the rows of an (N, n) array of cues at once."""
+        vectors = np.asarray(vectors)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+
+        self.validate_many(vectors)
+        self._mark(vectors)
+
 
-        r_io = self.vector_to_relation(vector)
-        self.abstract(r_io)
+    def unregister(self, vector) -> None:
+        """Undo one registration of vector in a counting memory."""
+        self.unregister_many(np.ravel(vector))
+
+
+    def unregister_many(self, vectors) -> None:
+        """Undo one registration of each row of an (N, n) array of vectors."""
+        if not self.counting:
+            raise AssociativeMemoryError('Only counting memories can unregister vectors.')
+        self._check_writeable()
+
+        vectors = np.asarray(vectors)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        self.validate_many(vectors)
+
+        decrements = np.zeros((self.m, self.n), dtype=np.uint32)
+        np.add.at(decrements, (vectors, np.broadcast_to(self._columns, vectors.shape)), 1)
+        if (decrements > self._counts).any():
+            raise AssociativeMemoryError('Vectors to unregister were not registered.')
+
+        self._counts -= decrements
+        cleared = (decrements > 0) & (self._counts == 0)
+        if self.timestamped:
+            self._stamps[cleared] = never
+        if self.packed:
+            self._words &= ~pack_columns(cleared)
+        else:
+            self._relation &= ~cleared
+        self._column_counts = self._column_counts - np.count_nonzero(cleared, axis=0)
+        self._invalidate()
 
 
     def recognize(self, vector):
-        self.validate(vector)
-        r_io = self.vector_to_relation(vector)
-        r_io = self.containment(r_io)
-        return np.count_nonzero(r_io == False) <= self.t
+        return self.mismatches(vector) <= self.t
 
 
     def mismatches(self, vector):
+        # Only the cells of the cue are looked at, no relation is built.
+        vector = np.ravel(vector)
         self.validate(vector)
-        r_io = self.vector_to_relation(vector)
-        r_io = self.containment(r_io)
-        return np.count_nonzero(r_io == False)
+        return self.n - np.count_nonzero(self._marked(vector))
+
+
+    def mismatches_many(self, cues):
+        """Return the number of mismatches of each row of a (B, n) array of cues."""
+        cues = np.asarray(cues)
+        if cues.ndim == 1:
+            cues = cues.reshape(1, -1)
+
+        self.validate_many(cues)
+        return self.n - np.count_nonzero(self._marked(cues), axis=1)
+
+
+    def recognize_many(self, cues):
+        return self.mismatches_many(cues) <= self.t
+
+
+    def coarsen(self, m):
+        """A new memory with range m, whose rows are the OR of self.m/m adjacent rows.
+
+        Cues quantized for this memory as q, should be q // (self.m/m) in the
+        coarser one.
+        """
+        if self.m % m:
+            raise ValueError('The new range size must divide', self.m, 'and given', m)
+        factor = self.m // m
+
+        memory = AssociativeMemory(self.n, m, self.t, self.packed, self.counting, self.timestamped, self.rng)
+        memory.relation = self.relation.reshape(m, factor, self.n).any(axis=1)
+        if self.counting:
+            memory._counts = self._counts.reshape(m, factor, self.n).sum(axis=1, dtype=np.uint32)
+        if self.timestamped:
+            memory._stamps = self._stamps.reshape(m, factor, self.n).min(axis=1)
+        memory._clock = self._clock
+        return memory
+
+
+    def relation_at(self, registrations):
+        """The relation of a timestamped memory after its first registrations."""
+        if not self.timestamped:
+            raise AssociativeMemoryError('Only timestamped memories keep their history.')
+        return self._stamps < registrations
+
+
+    def mismatches_at(self, cues, registrations):
+        """Mismatches of (B, n) cues after each number of registrations given.
+
+        Returns a (B, len(registrations)) array, computed from a single
+        look up of the cells of the cues.
+        """
+        if not self.timestamped:
+            raise AssociativeMemoryError('Only timestamped memories keep their history.')
+        cues = np.asarray(cues)
+        if cues.ndim == 1:
+            cues = cues.reshape(1, -1)
+        self.validate_many(cues)
+
+        stamps = self._stamps[cues, self._columns]
+        return np.count_nonzero(
+            stamps[:, :, np.newaxis] >= np.asarray(registrations), axis=1)
+
+
+    def merge(self, other) -> None:
+        """Add the registrations of other to this memory, as if made after its own.
+
+        The relations are OR-ed, counts are added and the time stamps of
+        other are shifted by the registrations of this memory, so merging
+        memories filled from consecutive parts of a corpus gives the memory
+        filled from the whole corpus.
+        """
+        if (other.n, other.m) != (self.n, self.m):
+            raise ValueError('Memories to merge must have the same n and m.')
+        if self.counting and not other.counting:
+            raise AssociativeMemoryError('A counting memory can only merge counting memories.')
+        if self.timestamped and not other.timestamped:
+            raise AssociativeMemoryError('A timestamped memory can only merge timestamped memories.')
+        self._check_writeable()
+
+        if self.counting:
+            self._counts += other._counts
+        if self.timestamped:
+            stamps = np.where(other._stamps == never, never, other._stamps + self._clock)
+            np.minimum(self._stamps, stamps, out=self._stamps)
+        self._clock += other._clock
+        if self.packed:
+            self._words |= other._words if other.packed else pack_columns(other.relation)
+        else:
+            self._relation |= other.relation
+        self._count_columns()
+
+
+    def union(self, other):
+        """A new memory with the registrations of this memory and then those of other."""
+        memory = AssociativeMemory(self.n, self.m, self.t, self.packed, self.counting, self.timestamped, self.rng)
+        memory.merge(self)
+        memory.merge(other)
+        return memory
+
+
+    def save(self, filename) -> None:
+        """Save the memory, with its counts and time stamps if kept, in a single file."""
+        arrays = [self._words if self.packed else self._relation]
+        if self.counting:
+            arrays.append(self._counts)
+        if self.timestamped:
+            arrays.append(self._stamps)
+        _write(filename, _new_header(_memory_kind, 1, self.n, self.m, self.t, self._clock,
+            self.packed, self.counting, self.timestamped), arrays)
+
+
+    @classmethod
+    def load(cls, filename, mmap_mode='r', rng=None) -> 'AssociativeMemory':
+        """Load a memory saved with save.
+
+        Its arrays are mapped from the file by numpy.memmap in mmap_mode
+        ('r' read only, 'r+' changes written to the file, 'c' copy on
+        write), or read into memory if mmap_mode is None. Read only
+        memories can be queried but not registered to.
+        """
+        header = _read_header(filename, _memory_kind)
+        n, m = int(header['n']), int(header['m'])
+        packed, counting, timestamped = (bool(header['packed']),
+            bool(header['counting']), bool(header['timestamped']))
+
+        specs = [(np.uint64, (n, -(-m // word_size))) if packed else (np.bool, (m, n))]
+        if counting:
+            specs.append((np.uint32, (m, n)))
+        if timestamped:
+            specs.append((np.int64, (m, n)))
+        arrays = _read_arrays(filename, specs, mmap_mode)
+
+        memory = cls(n, m, int(header['tolerance']), packed, counting, timestamped, rng)
+        if packed:
+            memory._words = arrays.pop(0)
+        else:
+            memory._relation = arrays.pop(0)
+        if counting:
+            memory._counts = arrays.pop(0)
+        if timestamped:
+            memory._stamps = arrays.pop(0)
+        memory._clock = int(header['registrations'])
+        memory._count_columns()
+        return memory
 
 
     def recall(self, vector):
@@ -218,3 +741,603 @@ class AssociativeMemory(object):
             r_io = np.full(self.n, self.undefined)
 
         return r_io
+
+
+class AssociativeMemoryBank(object):
+    def __init__(self, n_memories: int, n: int, m: int, tolerance = 0, timestamped = False, rng = None):
+        """
+        Parameters
+        ----------
+        n_memories : int
+            The number of memories in the bank.
+        n : int
+            The size of the domain (of properties).
+        m : int
+            The size of the range (of representation).
+        timestamped : bool
+            Keep the index of the first registration (across the whole
+            bank) that marked each cell.
+        rng : None, int, SeedSequence or Generator
+            Source of the random choices made when recalling, shared by
+            all the memories of the bank.
+        """
+        self.n_memories = n_memories
+        self.n = n
+        self.m = m
+        self.t = tolerance
+        self._timestamped = timestamped
+        self._clock = 0
+        self.rng = np.random.default_rng(rng)
+
+        self._stamps = None
+        # All memories share one (n_memories, m, n) array.
+        self.relations = np.zeros((self.n_memories, self.m, self.n), dtype=np.bool)
+        self._entropy = None
+        self._inverted_index = None
+        self._memories = {}
+        # Set last, so a shared segment is released after the arrays on it.
+        self._segment = None
+
+    def __len__(self):
+        return self.n_memories
+
+    def __getitem__(self, k):
+        """Return memory k as an AssociativeMemory whose relation is a view on the bank.
+
+        Views are kept until the relations change, so their column counts
+        and run indexes are computed once. Registering through a view
+        drops what the bank derived from its relations, and is refused
+        for timestamped and shared banks, which must register_many.
+        """
+        memory = self._memories.get(k)
+        if memory is None:
+            memory = AssociativeMemory(self.n, self.m, self.t, rng=self.rng)
+            memory.relation = self.relations[k]
+            memory._bank = self
+            self._memories[k] = memory
+        memory.t = self.t
+        memory.rng = self.rng
+        return memory
+
+    @property
+    def n_memories(self):
+        return self._n_memories
+
+    @n_memories.setter
+    def n_memories(self, value: int):
+        if value > 0:
+            self._n_memories = value
+        else:
+            raise ValueError('Invalid value for n_memories.')
+
+    @property
+    def n(self):
+        return self._n
+
+    @n.setter
+    def n(self, value: int):
+        if value > 0:
+            self._n = value
+        else:
+            raise ValueError('Invalid value for n.')
+
+    @property
+    def m(self):
+        return self._m
+
+    @m.setter
+    def m(self, value: int):
+        if value > 0:
+            self._m = value
+        else:
+            raise ValueError('Invalid value for m.')
+
+    @property
+    def relations(self):
+        return self._relations
+
+    @relations.setter
+    def relations(self, new_relations: np.ndarray):
+        if (isinstance(new_relations, np.ndarray) and
+                new_relations.dtype == np.bool and
+                new_relations.shape == (self.n_memories, self.m, self.n)):
+            self._relations = new_relations
+            if self.timestamped:
+                self._stamps = np.where(new_relations, 0, never)
+            self._invalidate()
+        else:
+            raise ValueError('Invalid relations assignment.')
+
+    @property
+    def timestamped(self):
+        return self._timestamped
+
+    @property
+    def stamps(self):
+        return self._stamps if self.timestamped else None
+
+    @property
+    def registrations(self):
+        return self._clock
+
+    @property
+    def entropy(self) -> np.ndarray:
+        """Return the entropy of every memory in the bank."""
+        if self._entropy is None:
+            # number of marked cells in the columns of each memory
+            v = np.count_nonzero(self.relations, axis=1)
+            self._entropy = np.log2(np.where(v == 0, 1, v)).sum(axis=1) / self.n
+        return self._entropy
+
+    @property
+    def undefined(self):
+        return np.nan
+
+
+    def _invalidate(self):
+        """Drop everything derived from the relations, as they have changed."""
+        self._entropy = None
+        self._inverted_index = None
+        self._memories = {}
+
+
+    def invalidate(self) -> None:
+        """Drop entropies, index and views computed so far, as another process changed the shared relations."""
+        self._load_registrations()
+        self._invalidate()
+
+
+    @property
+    def inverted_index(self):
+        """Memories having each cell marked, as an (n, m, words) array.
+
+        Entry [i, v] is a bitset, packed as by pack_bits, of the memories
+        whose relation marks value v of feature i.
+        """
+        if self._inverted_index is None:
+            self._inverted_index = pack_bits(self.relations.transpose(2, 1, 0))
+        return self._inverted_index
+
+
+    def _match_counts(self, cues):
+        """Number of features of each (b, n) cue marked by every memory.
+
+        The bitsets of the cue cells are added with a bit-sliced counter,
+        so the work per feature grows with n_memories/64 words rather
+        than with n_memories.
+        """
+        masks = self.inverted_index[np.arange(self.n), cues]
+        # Plane j holds bit j of the count of every memory.
+        planes = np.zeros((self.n.bit_length(), len(cues), masks.shape[-1]), dtype=np.uint64)
+        _add_to_planes(planes, masks)
+
+        counts = np.zeros((len(cues), self.n_memories), dtype=int)
+        for j, plane in enumerate(planes):
+            counts += unpack_bits(plane, self.n_memories).astype(int) << j
+        return counts
+
+
+    def validate_many(self, vectors):
+        if vectors.ndim != 2 or vectors.shape[1] != self.n:
+            raise ValueError('Invalid shape of the input data. Expected (N,', self.n, ') and given', vectors.shape)
+
+        if vectors.dtype.kind not in 'iu':
+            raise ValueError('Values in the input vectors must be integers, given', vectors.dtype)
+
+        if vectors.size and (vectors.max() >= self.m or vectors.min() < 0):
+            raise ValueError('Values in the input vectors must be between 0 and', self.m - 1)
+
+
+    def register_many(self, vectors, labels) -> None:
+        """Register each row of an (N, n) array of cues in the memory given by its label."""
+        vectors = np.asarray(vectors)
+        labels = np.asarray(labels)
+        self.validate_many(vectors)
+
+        if labels.shape != (len(vectors), ):
+            raise ValueError('Expected one label per vector.')
+        if labels.size and (labels.max() >= self.n_memories or labels.min() < 0):
+            raise ValueError('Labels are not valid memory indexes.')
+        if not self.relations.flags.writeable:
+            raise AssociativeMemoryError('The bank is read only.')
+
+        self._load_registrations()
+        self.relations[labels[:, np.newaxis], vectors, np.arange(self.n)] = True
+        if self.timestamped:
+            clocks = self._clock + np.arange(len(vectors))[:, np.newaxis]
+            np.minimum.at(self._stamps, (labels[:, np.newaxis], vectors,
+                np.broadcast_to(np.arange(self.n), vectors.shape)), clocks)
+        self._clock += len(vectors)
+        self._store_registrations()
+        self._invalidate()
+
+
+    def mismatches_many(self, cues):
+        """Return a (B, n_memories) matrix with the mismatches of every cue in every memory."""
+        cues = np.asarray(cues)
+        if cues.ndim == 1:
+            cues = cues.reshape(1, -1)
+        self.validate_many(cues)
+
+        mismatches = np.zeros((len(cues), self.n_memories), dtype=int)
+
+        # Bounds the memory used by each block of cues.
+        chunk = max(1, constants.chunk_cells // (self.n_memories*self.n))
+        for i in range(0, len(cues), chunk):
+            mismatches[i:i+chunk] = self.n - self._match_counts(cues[i:i+chunk])
+
+        return mismatches
+
+
+    def recognize_many(self, cues):
+        """Return a (B, n_memories) boolean matrix of the memories recognizing each cue.
+
+        Matches are counted as in mismatches_many, but compared with the
+        tolerance in the bit-sliced counter. The first 2(t+1) features of
+        the cues screen the memories, and counting goes on only for the
+        words of the index holding a memory that may still recognize the
+        cue, so the work falls with the memories the screen rejects.
+        """
+        cues = np.asarray(cues)
+        if cues.ndim == 1:
+            cues = cues.reshape(1, -1)
+        self.validate_many(cues)
+
+        recognized = np.zeros((len(cues), self.n_memories), dtype=np.bool)
+        if self.t >= self.n:
+            recognized[:] = True
+            return recognized
+
+        screen = min(2*(self.t + 1), self.n)
+        chunk = max(1, constants.chunk_cells // (self.n_memories*self.n))
+        for i in range(0, len(cues), chunk):
+            block = cues[i:i+chunk]
+            planes = np.zeros((self.n.bit_length(), len(block), self.inverted_index.shape[-1]),
+                dtype=np.uint64)
+            _add_to_planes(planes, self.inverted_index[np.arange(screen), block[:, :screen]])
+            b, w = np.nonzero(_at_least(planes, screen - self.t))
+
+            # The rest of the features, for the surviving words only.
+            planes = planes[:, b, w, np.newaxis]
+            features = np.arange(screen, self.n)
+            _add_to_planes(planes, self.inverted_index[features, block[b][:, screen:], w[:, np.newaxis], np.newaxis])
+            words = _at_least(planes, self.n - self.t)[:, 0]
+
+            p, j = np.nonzero(unpack_bits(words[:, np.newaxis], word_size))
+            recognized[i + b[p], w[p]*word_size + j] = True
+
+        return recognized
+
+
+    def nearest(self, cues, k=1):
+        """The k memories with the fewest mismatches with each of (B, n) cues.
+
+        Memories are ranked by mismatches and then by entropy, lowest
+        first, whether they recognize the cue or not. Returns two (B, k)
+        arrays: the indexes of the memories, in rank order, and their
+        mismatches.
+        """
+        if k < 1:
+            raise ValueError('At least one memory must be asked for, given', k)
+        k = min(k, self.n_memories)
+        mismatches = self.mismatches_many(cues)
+
+        # Both criteria in one integer key, so a single partition selects.
+        ranks = np.empty(self.n_memories, dtype=int)
+        ranks[np.argsort(self.entropy, kind='stable')] = np.arange(self.n_memories)
+        keys = mismatches*self.n_memories + ranks
+
+        nearest = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(keys, nearest, axis=1), axis=1)
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        return nearest, np.take_along_axis(mismatches, nearest, axis=1)
+
+
+    def coarsen(self, m):
+        """A new bank with range m, whose rows are the OR of self.m/m adjacent rows."""
+        if self.m % m:
+            raise ValueError('The new range size must divide', self.m, 'and given', m)
+        factor = self.m // m
+
+        bank = AssociativeMemoryBank(self.n_memories, self.n, m, self.t, self.timestamped, self.rng)
+        bank.relations = self.relations.reshape(self.n_memories, m, factor, self.n).any(axis=2)
+        if self.timestamped:
+            bank._stamps = self._stamps.reshape(self.n_memories, m, factor, self.n).min(axis=2)
+        bank._clock = self._clock
+        return bank
+
+
+    def snapshot(self, registrations):
+        """A new bank with the relations of a timestamped bank after its first registrations."""
+        if not self.timestamped:
+            raise AssociativeMemoryError('Only timestamped banks keep their history.')
+        bank = AssociativeMemoryBank(self.n_memories, self.n, self.m, self.t, rng=self.rng)
+        bank.relations = self._stamps < registrations
+        return bank
+
+
+    def mismatches_at(self, cues, registrations):
+        """Mismatches of (B, n) cues in every memory after each number of registrations.
+
+        Returns a (B, n_memories, len(registrations)) array, so the whole
+        filling curve comes from a single look up of the cells of the cues.
+        """
+        if not self.timestamped:
+            raise AssociativeMemoryError('Only timestamped banks keep their history.')
+        cues = np.asarray(cues)
+        if cues.ndim == 1:
+            cues = cues.reshape(1, -1)
+        self.validate_many(cues)
+
+        registrations = np.asarray(registrations)
+        mismatches = np.zeros((len(cues), self.n_memories, len(registrations)), dtype=int)
+
+        chunk = max(1, constants.chunk_cells // (self.n_memories*self.n*len(registrations)))
+        columns = np.arange(self.n)
+        for i in range(0, len(cues), chunk):
+            stamps = self._stamps[:, cues[i:i+chunk], columns]
+            mismatches[i:i+chunk] = np.count_nonzero(
+                stamps[..., np.newaxis] >= registrations, axis=2).transpose(1, 0, 2)
+
+        return mismatches
+
+
+    def merge(self, other) -> None:
+        """Add the registrations of other to this bank, as if made after its own.
+
+        Relations are OR-ed and, for timestamped banks, the time stamps of
+        other are shifted by the registrations of this bank.
+        """
+        if (other.n_memories, other.n, other.m) != (self.n_memories, self.n, self.m):
+            raise ValueError('Banks to merge must have the same n_memories, n and m.')
+        if self.timestamped and not other.timestamped:
+            raise AssociativeMemoryError('A timestamped bank can only merge timestamped banks.')
+
+        self._load_registrations()
+        other._load_registrations()
+        self._relations |= other.relations
+        if self.timestamped:
+            stamps = np.where(other._stamps == never, never, other._stamps + self._clock)
+            np.minimum(self._stamps, stamps, out=self._stamps)
+        self._clock += other._clock
+        self._store_registrations()
+        self._invalidate()
+
+
+    def union(self, other):
+        """A new bank with the registrations of this bank and then those of other."""
+        bank = AssociativeMemoryBank(self.n_memories, self.n, self.m, self.t, self.timestamped, self.rng)
+        bank.merge(self)
+        bank.merge(other)
+        return bank
+
+
+    def save(self, filename) -> None:
+        """Save the bank, with its time stamps if kept, in a single file."""
+        arrays = [self._relations]
+        if self.timestamped:
+            arrays.append(self._stamps)
+        _write(filename, _new_header(_bank_kind, self.n_memories, self.n, self.m, self.t, self._clock,
+            False, False, self.timestamped), arrays)
+
+
+    @classmethod
+    def load(cls, filename, mmap_mode='r', rng=None) -> 'AssociativeMemoryBank':
+        """Load a bank saved with save.
+
+        Its arrays are mapped from the file as by AssociativeMemory.load,
+        so even a large bank is ready at once and, read only, can be
+        shared by many processes.
+        """
+        header = _read_header(filename, _bank_kind)
+        return cls._restore(header, _read_arrays(filename, cls._specs(header), mmap_mode), rng)
+
+
+    @classmethod
+    def create_shared(cls, n_memories: int, n: int, m: int, tolerance = 0, timestamped = False,
+            rng = None, name = None) -> 'AssociativeMemoryBank':
+        """A new bank whose relations, and time stamps, live in a shared memory segment.
+
+        The segment is laid out as a saved bank. Other processes use the
+        same bank, without copying it, by attach_shared(bank.name) or by
+        receiving it pickled, as joblib workers receive their arguments.
+        Registrations made by one process are seen by all, which should call
+        invalidate before querying again. Time stamps are only consistent
+        if one process registers at a time.
+        """
+        header = _new_header(_bank_kind, n_memories, n, m, tolerance, 0, False, False, timestamped)
+        segment = shared_memory.SharedMemory(name, create=True, size=_offsets(cls._specs(header[0]))[1])
+        segment.buf[:header.nbytes] = header.tobytes()
+        bank = cls._on_segment(segment, rng)
+        if timestamped:
+            bank._stamps[:] = never
+        return bank
+
+
+    @classmethod
+    def attach_shared(cls, name, rng=None) -> 'AssociativeMemoryBank':
+        """The bank living in the shared memory segment with the given name."""
+        return cls._on_segment(_open_shared(name), rng)
+
+
+    @classmethod
+    def _on_segment(cls, segment, rng):
+        header = np.ndarray(1, dtype=_header, buffer=segment.buf).copy()
+        header = _checked_header(header, _bank_kind, segment.name)
+        specs = cls._specs(header)
+        arrays = [np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)
+            for (dtype, shape), offset in zip(specs, _offsets(specs)[0])]
+        bank = cls._restore(header, arrays, rng)
+        bank._segment = segment
+        return bank
+
+
+    @staticmethod
+    def _specs(header):
+        """The (dtype, shape) of the arrays of a bank stored after header."""
+        shape = (int(header['n_memories']), int(header['m']), int(header['n']))
+        specs = [(np.bool, shape)]
+        if header['timestamped']:
+            specs.append((np.int64, shape))
+        return specs
+
+
+    @classmethod
+    def _restore(cls, header, arrays, rng):
+        # Built without time stamps, which are then taken from arrays.
+        bank = cls(int(header['n_memories']), int(header['n']), int(header['m']),
+            int(header['tolerance']), rng=rng)
+        bank._relations = arrays[0]
+        bank._timestamped = bool(header['timestamped'])
+        if bank.timestamped:
+            bank._stamps = arrays[1]
+        bank._clock = int(header['registrations'])
+        return bank
+
+
+    def _load_registrations(self):
+        """Take the registrations of a shared bank from its segment, as other processes may have added theirs."""
+        if self._segment is not None:
+            self._clock = int(np.ndarray(1, dtype=_header, buffer=self._segment.buf)['registrations'][0])
+
+
+    def _store_registrations(self):
+        """Keep the registrations of a shared bank in its segment, for processes attaching later."""
+        if self._segment is not None:
+            np.ndarray(1, dtype=_header, buffer=self._segment.buf)['registrations'] = self._clock
+
+
+    @property
+    def name(self):
+        """Name of the shared memory segment of the bank, None if not shared."""
+        return None if self._segment is None else self._segment.name
+
+
+    def __reduce_ex__(self, protocol):
+        # Shared banks are pickled by the name of their segment.
+        if self._segment is None:
+            return super().__reduce_ex__(protocol)
+        return _attached_bank, (type(self), self.name, self.t, self.rng)
+
+
+    def close(self) -> None:
+        """Detach this process from the segment of a shared bank, which can no longer be used."""
+        if self._segment is None:
+            raise AssociativeMemoryError('The bank is not shared.')
+        self._relations = None
+        self._stamps = None
+        self._invalidate()
+        self._segment.close()
+
+
+    def unlink(self) -> None:
+        """Remove the segment of a shared bank, once every process has closed it."""
+        if self._segment is None:
+            raise AssociativeMemoryError('The bank is not shared.')
+        self._segment.unlink()
+
+
+    def recall_best(self, cue, recognized=None, rng=None, by_entropy=True):
+        """Recall cue from the memory with the lowest entropy among those recognizing it.
+
+        Returns the index of that memory and the recalled vector, or None and
+        an undefined vector if no memory recognizes the cue. Only the chosen
+        memory reduces its relation. Which memories recognize the cue may be
+        given, if already known. The memory is chosen as by best_memories,
+        with the same rng and by_entropy.
+        """
+        cue = np.ravel(cue)
+        if recognized is None:
+            recognized = self.recognize_many(cue)[0]
+        k = int(self.best_memories(np.reshape(recognized, (1, -1)), rng, by_entropy)[0])
+        if k < 0:
+            return None, np.full(self.n, self.undefined)
+        return k, self[k].lreduce(cue)
+
+
+    def best_memories(self, recognitions, rng=None, by_entropy=True):
+        """Return the memory with the lowest entropy among those recognizing each cue.
+
+        recognitions is a (B, n_memories) boolean matrix, as returned by
+        recognize_many. Ties go to the first memory or, if rng (a seed or
+        Generator) is given, to a random one. Without by_entropy the memory
+        is chosen at random among all those recognizing the cue. Random
+        numbers for the whole batch are drawn at once. Cues no memory
+        recognizes get -1.
+        """
+        recognitions = np.asarray(recognitions, dtype=bool)
+        if (not by_entropy) or (rng is not None):
+            noise = np.random.default_rng(rng).random(recognitions.shape)
+
+        if by_entropy:
+            keys = np.where(recognitions, self.entropy, np.inf)
+            if rng is not None:
+                lowest = recognitions & (keys == keys.min(axis=1, keepdims=True))
+                keys = np.where(lowest, noise, np.inf)
+        else:
+            keys = np.where(recognitions, noise, np.inf)
+
+        best = np.argmin(keys, axis=1)
+        best[~recognitions.any(axis=1)] = -1
+        return best
+
+
+def _add_to_planes(planes, masks):
+    """Add the bitsets masks[..., i, :], for every i, to the bit-sliced counter planes."""
+    for i in range(masks.shape[-2]):
+        carry = masks[..., i, :]
+        for plane in planes:
+            if not carry.any():
+                break
+            plane ^= carry
+            carry = carry & ~plane
+
+
+def _at_least(planes, count):
+    """Bitset of the counters in planes holding count or more, for count > 0."""
+    greater = np.zeros(planes.shape[1:], dtype=np.uint64)
+    equal = np.full(planes.shape[1:], ~np.uint64(0))
+    for j in reversed(range(len(planes))):
+        if (count >> j) & 1:
+            equal &= planes[j]
+        else:
+            greater |= equal & planes[j]
+            equal &= ~planes[j]
+    return greater | equal
+
+
+def _attached_bank(cls, name, tolerance, rng):
+    bank = cls.attach_shared(name, rng)
+    bank.t = tolerance
+    return bank
+
+
+def _filled_part(n_memories, n, m, timestamped, vectors, labels):
+    bank = AssociativeMemoryBank(n_memories, n, m, timestamped=timestamped)
+    bank.register_many(vectors, labels)
+    return bank
+
+
+def fill_parallel(bank, vectors, labels, n_jobs=None):
+    """Register each row of (N, n) vectors in the memory of bank given by its label.
+
+    The vectors are split in n_jobs consecutive parts (constants.n_jobs by
+    default, negative values counting back from the number of CPUs, as in
+    joblib), each part fills a bank in its own process, and the partial
+    banks are merged in order, so the result, time stamps included, is
+    the same as that of bank.register_many(vectors, labels).
+    """
+    n_jobs = effective_n_jobs(constants.n_jobs if n_jobs is None else n_jobs)
+    vectors = np.asarray(vectors)
+    labels = np.asarray(labels)
+    bank.validate_many(vectors)
+    if labels.shape != (len(vectors), ):
+        raise ValueError('Expected one label per vector.')
+
+    bounds = np.linspace(0, len(vectors), n_jobs + 1).astype(int)
+    parts = Parallel(n_jobs=n_jobs)(
+        delayed(_filled_part)(bank.n_memories, bank.n, bank.m, bank.timestamped,
+                              vectors[start:end], labels[start:end])
+        for start, end in zip(bounds[:-1], bounds[1:]))
+    for part in parts:
+        bank.merge(part)
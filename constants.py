@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 import os
 
 # Directory where all results are stored.
@@ -35,7 +36,12 @@ def tolerance_suffix(tolerance):
     return '' if not tolerance else '-tol_' + str(tolerance).zfill(3)
 
 
-def filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0, extension=''):
+def quantization_suffix(quantization):
+    # Results of the default (linear) quantization keep their names.
+    return '' if quantization in (None, 'linear') else '-qnt_' + quantization
+
+
+def filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0, extension='', quantization=None):
     """ Returns a file name in run_path directory with a given extension and an index
     """
     # Create target directory & all intermediate directories if don't exists
@@ -46,12 +52,12 @@ def filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0, extension
         pass
 
     if idx is None:
-        return run_path + '/' + s + extension
+        return run_path + '/' + s + quantization_suffix(quantization) + extension
     else:
         return run_path + '/' + s + '-' + str(idx).zfill(3) \
             + occlusion_suffix(occlusion) \
             + bars_type_suffix(bars_type) + \
-            tolerance_suffix(tolerance) + extension
+            tolerance_suffix(tolerance) + quantization_suffix(quantization) + extension
 
 
 def json_filename(s):
@@ -60,10 +66,10 @@ def json_filename(s):
     return filename(s,  extension='.json')
 
 
-def csv_filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0):
+def csv_filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0, quantization=None):
     """ Returns a file name for csv(i) in run_path directory
     """
-    return filename(s, idx, occlusion, bars_type, tolerance, '.csv')
+    return filename(s, idx, occlusion, bars_type, tolerance, '.csv', quantization)
 
 
 def data_filename(s, idx=None):
@@ -72,10 +78,16 @@ def data_filename(s, idx=None):
     return filename(s, idx, extension='.npy')
 
 
-def picture_filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0):
+def quantized_filename(s, idx, scheme, msize, digest):
+    """ Returns a file name for features s quantized by scheme, with parameters digest, for memory size msize.
+    """
+    return filename(s + '-' + scheme + '_' + digest + '-msz_' + str(msize).zfill(3), idx, extension='.npz')
+
+
+def picture_filename(s, idx=None, occlusion=None, bars_type=None, tolerance=0, quantization=None):
     """ Returns a file name for a graph.
     """
-    return filename(s, idx, occlusion, bars_type, tolerance, '.svg')
+    return filename(s, idx, occlusion, bars_type, tolerance, '.svg', quantization)
 
 
 def model_filename(s, idx=None):
@@ -104,10 +116,11 @@ def testing_directory(i, occlusion=None, bars_type=None):
         + occlusion_suffix(occlusion) + bars_type_suffix(bars_type)
 
 
-def memories_directory(i, occlusion=None, bars_type=None, tolerance=0):
+def memories_directory(i, occlusion=None, bars_type=None, tolerance=0, quantization=None):
     return memories_path + '-' + str(i).zfill(3) \
         + occlusion_suffix(occlusion) \
-        + bars_type_suffix(bars_type) + tolerance_suffix(tolerance)
+        + bars_type_suffix(bars_type) + tolerance_suffix(tolerance) \
+        + quantization_suffix(quantization)
 
 
 def memory_filename(dir, msize, stage, idx, label):
@@ -159,11 +172,12 @@ def features_name(i=-1, occlusion=None, bars_type=None):
 memories_prefix = 'memories'
 
 
-def memories_name(i=-1, occlusion=None, bars_type=None, tolerance=0):
+def memories_name(i=-1, occlusion=None, bars_type=None, tolerance=0, quantization=None):
     mem_name = memories_prefix
     if i >= 0:
         mem_name += experiment_suffix[i] + occlusion_suffix(occlusion) \
-            + bars_type_suffix(bars_type) + tolerance_suffix(tolerance)
+            + bars_type_suffix(bars_type) + tolerance_suffix(tolerance) \
+            + quantization_suffix(quantization)
     return mem_name
 
 
@@ -220,6 +234,17 @@ memory_fills = [1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, 100.0]
 partial_ideal_memory_size = 128
 full_ideal_memory_size = 128
 
+# Maximum number of relation cells gathered at once by batch queries,
+# and of values processed at once when streaming through data files.
+chunk_cells = 1 << 24
+
+
+def row_chunks(array):
+    """ Returns slices of consecutive rows of array holding about chunk_cells values each.
+    """
+    rows = max(1, chunk_cells // max(1, math.prod(array.shape[1:])))
+    return [slice(i, i + rows) for i in range(0, len(array), rows)]
+
 CHARACTERIZE = -2
 TRAIN_NN = -1
 GET_FEATURES = 0
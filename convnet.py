@@ -477,7 +477,7 @@ def obtain_features(model_prefix, features_prefix, labels_prefix, data_prefix,
     return histories
 
 
-def remember(experiment, occlusion=None, bars_type=None, tolerance=0):
+def remember(experiment, occlusion=None, bars_type=None, tolerance=0, quantization_mode='linear'):
     """ Creates images from features.
 
     Uses the decoder part of the neural networks to (re)create images from features.
@@ -490,6 +490,8 @@ def remember(experiment, occlusion=None, bars_type=None, tolerance=0):
         DESCRIPTION. The default is None.
     tolerance : TYPE, optional
         DESCRIPTION. The default is 0.
+    quantization_mode : str, optional
+        Quantization the memories were recalled with. The default is 'linear'.
 
     Returns
     -------
@@ -509,17 +511,17 @@ def remember(experiment, occlusion=None, bars_type=None, tolerance=0):
         testing_labels_filename = constants.data_filename(
             testing_labels_filename, i)
         memories_filename = constants.memories_name(
-            experiment, occlusion, bars_type, tolerance)
+            experiment, occlusion, bars_type, tolerance, quantization_mode)
         memories_filename = constants.data_filename(memories_filename, i)
         labels_filename = constants.labels_name + constants.memory_suffix
         labels_filename = constants.data_filename(labels_filename, i)
         model_filename = constants.model_filename(constants.model_name, i)
 
-        testing_data = np.load(testing_data_filename)
-        testing_features = np.load(testing_features_filename)
-        testing_labels = np.load(testing_labels_filename)
-        memories = np.load(memories_filename)
-        labels = np.load(labels_filename)
+        testing_data = np.load(testing_data_filename, mmap_mode='r')
+        testing_features = np.load(testing_features_filename, mmap_mode='r')
+        testing_labels = np.load(testing_labels_filename, mmap_mode='r')
+        memories = np.load(memories_filename, mmap_mode='r')
+        labels = np.load(labels_filename, mmap_mode='r')
         model = tf.keras.models.load_model(model_filename)
 
         # Drop the classifier.
@@ -535,14 +537,14 @@ def remember(experiment, occlusion=None, bars_type=None, tolerance=0):
         for dlayer, alayer in zip(decoder.layers[1:], autoencoder.layers[31:]):
             dlayer.set_weights(alayer.get_weights())
 
-        produced_images = decoder.predict(testing_features)
         n = len(testing_labels)
-
-        Parallel(n_jobs=constants.n_jobs, verbose=5)(
-            delayed(store_images)(original, produced, constants.testing_directory(
-                experiment, occlusion, bars_type), i, j, label)
-            for (j, original, produced, label) in
-            zip(range(n), testing_data, produced_images, testing_labels))
+        for rows in constants.row_chunks(testing_data):
+            produced_images = decoder.predict(testing_features[rows])
+            Parallel(n_jobs=constants.n_jobs, verbose=5)(
+                delayed(store_images)(original, produced, constants.testing_directory(
+                    experiment, occlusion, bars_type), i, j, label)
+                for (j, original, produced, label) in
+                zip(range(n)[rows], testing_data[rows], produced_images, testing_labels[rows]))
 
         total = len(memories)
         steps = len(constants.memory_fills)
@@ -558,5 +560,5 @@ def remember(experiment, occlusion=None, bars_type=None, tolerance=0):
 
             Parallel(n_jobs=constants.n_jobs, verbose=5)(
                 delayed(store_memories)(label, produced, features, constants.memories_directory(
-                    experiment, occlusion, bars_type, tolerance), i, j)
+                    experiment, occlusion, bars_type, tolerance, quantization_mode), i, j)
                 for (produced, features, label) in zip(produced_images, mem_data, mem_labels))
@@ -27,7 +27,9 @@ import json
 
 import constants
 import convnet
-from associative import AssociativeMemory
+import metrics
+import quantization
+from associative import AssociativeMemoryBank, fill_parallel
 
 # Translation
 gettext.install('ame', localedir=None, codeset=None, names=None)
@@ -39,7 +41,8 @@ def print_error(*s):
 
 def plot_pre_graph(pre_mean, rec_mean, ent_mean, pre_std, rec_std, ent_std,
                    tag='', xlabels=constants.memory_sizes, xtitle=None,
-                   ytitle=None, action=None, occlusion=None, bars_type=None, tolerance=0):
+                   ytitle=None, action=None, occlusion=None, bars_type=None, tolerance=0,
+                   quantization=None):
 
     plt.clf()
     plt.figure(figsize=(6.4, 4.8))
@@ -88,11 +91,11 @@ def plot_pre_graph(pre_mean, rec_mean, ent_mean, pre_std, rec_std, ent_std,
 
     s = tag + 'graph_prse_MEAN' + _('-english')
     graph_filename = constants.picture_filename(
-        s, action, occlusion, bars_type, tolerance)
+        s, action, occlusion, bars_type, tolerance, quantization)
     plt.savefig(graph_filename, dpi=600)
 
 
-def plot_size_graph(response_size, size_stdev, action=None, tolerance=0):
+def plot_size_graph(response_size, size_stdev, action=None, tolerance=0, quantization=None):
     plt.clf()
 
     full_length = 100.0
@@ -118,11 +121,12 @@ def plot_size_graph(response_size, size_stdev, action=None, tolerance=0):
     plt.grid(True)
 
     graph_filename = constants.picture_filename(
-        'graph_size_MEAN' + _('-english'), action, tolerance=tolerance)
+        'graph_size_MEAN' + _('-english'), action, tolerance=tolerance, quantization=quantization)
     plt.savefig(graph_filename, dpi=600)
 
 
-def plot_behs_graph(no_response, no_correct, no_chosen, correct, action=None, tolerance=0):
+def plot_behs_graph(no_response, no_correct, no_chosen, correct, action=None, tolerance=0,
+                    quantization=None):
 
     for i in range(len(no_response)):
         total = (no_response[i] + no_correct[i] +
@@ -165,7 +169,8 @@ def plot_behs_graph(no_response, no_correct, no_chosen, correct, action=None, to
     plt.grid(axis='y')
 
     graph_filename = constants.picture_filename(
-        'graph_behaviours_MEAN' + _('-english'), action, tolerance=tolerance)
+        'graph_behaviours_MEAN' + _('-english'), action, tolerance=tolerance,
+        quantization=quantization)
     plt.savefig(graph_filename, dpi=600)
 
 
@@ -220,131 +225,31 @@ def plot_features_graph(domain, means, stdevs, experiment, occlusion=None, bars_
         plt.savefig(constants.picture_filename(filename), dpi=500)
 
 
-def get_label(memories, entropies=None):
-
-    # Random selection
-    if entropies is None:
-        i = random.atddrange(len(memories))
-        return memories[i]
-    else:
-        i = memories[0]
-        entropy = entropies[i]
-
-        for j in memories[1:]:
-            if entropy > entropies[j]:
-                i = j
-                entropy = entropies[i]
-
-    return i
-
-
-def msize_features(features, msize, min_value, max_value):
-    return np.round((msize-1)*(features-min_value) / (max_value-min_value)).astype(np.int16)
-
-
-def get_ams_results(midx, msize, domain, lpm, trf, tef, trl, tel, tolerance=0):
-
-    # Round the values
-    max_value = trf.max()
-    other_value = tef.max()
-    max_value = max_value if max_value > other_value else other_value
-
-    min_value = trf.min()
-    other_value = tef.min()
-    min_value = min_value if min_value < other_value else other_value
-
-    trf_rounded = msize_features(trf, msize, min_value, max_value)
-    tef_rounded = msize_features(tef, msize, min_value, max_value)
-
-    n_labels = constants.n_labels
-    nmems = int(n_labels/lpm)
-
-    measures = np.zeros((constants.n_measures, nmems), dtype=np.float64)
-    entropy = np.zeros(nmems, dtype=np.float64)
-    behaviour = np.zeros(constants.n_behaviours, dtype=np.float64)
-
-    # Confusion matrix for calculating precision and recall per memory.
-    cms = np.zeros((nmems, 2, 2))
-    TP = (0, 0)
-    FP = (0, 1)
-    FN = (1, 0)
-    TN = (1, 1)
-
-    # Create the required associative memories.
-    ams = dict.fromkeys(range(nmems))
-    for m in ams:
-        ams[m] = AssociativeMemory(domain, msize, tolerance)
-
-    # Registration
-    for features, label in zip(trf_rounded, trl):
-        m = int(label/lpm)
-        ams[m].register(features)
+def get_ams_results(midx, ams, lpm, tef_rounded, tel):
+    msize = ams.m
+    nmems = ams.n_memories
 
     # Calculate entropies
-    for m in ams:
-        entropy[m] = ams[m].entropy
+    entropy = np.array(ams.entropy, dtype=np.float64)
 
     # Recognition
-    response_size = 0
+    recognitions = ams.recognize_many(tef_rounded)
+    correct = (np.asarray(tel)/lpm).astype(int)
+    chosen = ams.best_memories(recognitions)
 
-    for features, label in zip(tef_rounded, tel):
-        correct = int(label/lpm)
+    behaviour = metrics.behaviours(recognitions, correct, chosen)
 
-        memories = []
-        for k in ams:
-            recognized = ams[k].recognize(features)
-            if recognized:
-                memories.append(k)
-
-            # For calculation of per memory precision and recall
-            if (k == correct) and recognized:
-                cms[k][TP] += 1
-            elif k == correct:
-                cms[k][FN] += 1
-            elif recognized:
-                cms[k][FP] += 1
-            else:
-                cms[k][TN] += 1
-
-        response_size += len(memories)
-        if len(memories) == 0:
-            # Register empty case
-            behaviour[constants.no_response_idx] += 1
-        elif not (correct in memories):
-            behaviour[constants.no_correct_response_idx] += 1
-        else:
-            l = get_label(memories, entropy)
-            if l != correct:
-                behaviour[constants.no_correct_chosen_idx] += 1
-            else:
-                behaviour[constants.correct_response_idx] += 1
-
-    behaviour[constants.mean_responses_idx] = response_size / \
-        float(len(tef_rounded))
-    all_responses = len(tef_rounded) - behaviour[constants.no_response_idx]
-    all_precision = (
-        behaviour[constants.correct_response_idx])/float(all_responses)
-    all_recall = (behaviour[constants.correct_response_idx]
-                  )/float(len(tef_rounded))
-
-    behaviour[constants.precision_idx] = all_precision
-    behaviour[constants.recall_idx] = all_recall
-
-    for m in range(nmems):
-        total_positives = cms[m][TP] + cms[m][FP]
-        if total_positives == 0:
-            print(
-                f'Memory {m} in run {midx}, memory size {msize}, did not respond.')
-            measures[constants.precision_idx, m] = 1
-        else:
-            measures[constants.precision_idx, m] = cms[m][TP] / total_positives
-        measures[constants.recall_idx, m] = cms[m][TP] / \
-            (cms[m][TP] + cms[m][FN])
+    # Confusion matrix for calculating precision and recall per memory.
+    cms = metrics.confusion_matrices(recognitions, correct)
+    measures = metrics.memory_measures(cms)
+    for m in np.flatnonzero(cms[(slice(None), ) + metrics.TP] + cms[(slice(None), ) + metrics.FP] == 0):
+        print(
+            f'Memory {m} in run {midx}, memory size {msize}, did not respond.')
 
     return (midx, measures, entropy, behaviour)
 
 
-def test_memories(domain, experiment):
+def test_memories(domain, experiment, quantization_mode='linear'):
 
     average_entropy = []
     stdev_entropy = []
@@ -370,27 +275,27 @@ def test_memories(domain, experiment):
         gc.collect()
 
         suffix = constants.filling_suffix
-        training_features_filename = constants.features_name(
+        training_features_prefix = constants.features_name(
             experiment) + suffix
         training_features_filename = constants.data_filename(
-            training_features_filename, i)
+            training_features_prefix, i)
         training_labels_filename = constants.labels_name + suffix
         training_labels_filename = constants.data_filename(
             training_labels_filename, i)
 
         suffix = constants.testing_suffix
-        testing_features_filename = constants.features_name(
+        testing_features_prefix = constants.features_name(
             experiment) + suffix
         testing_features_filename = constants.data_filename(
-            testing_features_filename, i)
+            testing_features_prefix, i)
         testing_labels_filename = constants.labels_name + suffix
         testing_labels_filename = constants.data_filename(
             testing_labels_filename, i)
 
-        training_features = np.load(training_features_filename)
-        training_labels = np.load(training_labels_filename)
-        testing_features = np.load(testing_features_filename)
-        testing_labels = np.load(testing_labels_filename)
+        training_features = np.load(training_features_filename, mmap_mode='r')
+        training_labels = np.load(training_labels_filename, mmap_mode='r')
+        testing_features = np.load(testing_features_filename, mmap_mode='r')
+        testing_labels = np.load(testing_labels_filename, mmap_mode='r')
 
         measures_per_size = np.zeros((len(constants.memory_sizes),
                                       n_memories, constants.n_measures), dtype=np.float64)
@@ -403,10 +308,22 @@ def test_memories(domain, experiment):
 
         print('Train the different co-domain memories -- NxM: ',
               experiment, ' run: ', i)
+
+        # Memories are filled once, with the largest size, and smaller
+        # sizes are derived from them.
+        quantizer = quantization.fitted(quantization_mode, training_features, testing_features,
+                                        constants.memory_sizes)
+        fine_msize = max(constants.memory_sizes)
+        training_rounded = quantizer.cached(training_features_prefix, i, [fine_msize])[fine_msize]
+        testing_rounded = quantizer.cached(testing_features_prefix, i, constants.memory_sizes)
+
+        ams = AssociativeMemoryBank(n_memories, domain, fine_msize)
+        fill_parallel(ams, training_rounded, (training_labels/labels_x_memory).astype(int))
+
         # Processes running in parallel.
         list_measures_entropies = Parallel(n_jobs=constants.n_jobs, verbose=50)(
-            delayed(get_ams_results)(midx, msize, domain, labels_x_memory,
-                                     training_features, testing_features, training_labels, testing_labels)
+            delayed(get_ams_results)(midx, ams.coarsen(msize), labels_x_memory,
+                                     testing_rounded[msize], testing_labels)
             for midx, msize in enumerate(constants.memory_sizes))
 
         for j, measures, entropy, behaviour in list_measures_entropies:
@@ -525,127 +442,86 @@ def test_memories(domain, experiment):
     main_behaviours = [main_no_response, main_no_correct_response,
                        main_no_correct_chosen, main_correct_chosen, main_total_responses]
 
-    np.savetxt(constants.csv_filename('main_average_precision--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_average_precision--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_average_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_all_average_precision--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_all_average_precision--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_all_average_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_average_recall--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_average_recall--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_average_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_all_average_recall--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_all_average_recall--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_all_average_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_average_entropy--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_average_entropy--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_average_entropy, delimiter=',')
 
-    np.savetxt(constants.csv_filename('main_stdev_precision--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_stdev_precision--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_stdev_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_all_stdev_precision--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_all_stdev_precision--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_all_stdev_precision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_stdev_recall--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_stdev_recall--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_stdev_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_all_stdev_recall--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_all_stdev_recall--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_all_stdev_recall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_stdev_entropy--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_stdev_entropy--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_stdev_entropy, delimiter=',')
 
-    np.savetxt(constants.csv_filename('main_behaviours--{0}'.format(experiment)),
+    np.savetxt(constants.csv_filename('main_behaviours--{0}'.format(experiment),
+                                      quantization=quantization_mode),
                main_behaviours, delimiter=',')
 
     plot_pre_graph(main_average_precision, main_average_recall, main_average_entropy,
-                   main_stdev_precision, main_stdev_recall, main_stdev_entropy, action=experiment)
+                   main_stdev_precision, main_stdev_recall, main_stdev_entropy, action=experiment,
+                   quantization=quantization_mode)
 
     plot_pre_graph(main_all_average_precision, main_all_average_recall,
                    main_average_entropy, main_all_stdev_precision, main_all_stdev_recall,
-                   main_stdev_entropy, 'overall', action=experiment)
+                   main_stdev_entropy, 'overall', action=experiment, quantization=quantization_mode)
 
     plot_size_graph(main_total_responses,
-                    main_total_responses_stdev, action=experiment)
+                    main_total_responses_stdev, action=experiment, quantization=quantization_mode)
 
     plot_behs_graph(main_no_response, main_no_correct_response, main_no_correct_chosen,
-                    main_correct_chosen, action=experiment)
+                    main_correct_chosen, action=experiment, quantization=quantization_mode)
 
     print('Test complete')
 
 
-def get_recalls(ams, msize, domain, min, max, trf, trl, tef, tel, idx):
-
-    trf_rounded = np.round((trf - min) * (msize - 1) /
-                           (max - min)).astype(np.int16)
-    tef_rounded = np.round((tef - min) * (msize - 1) /
-                           (max - min)).astype(np.int16)
-
-    n_mems = constants.n_labels
-    measures = np.zeros((constants.n_measures, n_mems), dtype=np.float64)
-    entropy = np.zeros((n_mems, ), dtype=np.float64)
-
-    # Confusion matrix for calculating precision and recall per memory.
-    cms = np.zeros((n_mems, 2, 2))
-    TP = (0, 0)
-    FP = (0, 1)
-    FN = (1, 0)
-    TN = (1, 1)
-
-    # Confusion matrix for calculating overall precision and recall.
-    cm = np.zeros((2, 2))
-
-    # Registration
-    for features, label in zip(trf_rounded, trl):
-        ams[label].register(features)
+def get_recalls(ams, msize, domain, quantizer, tef_rounded, tel, all_mismatches, idx):
 
     # Calculate entropies
-    for j in ams:
-        entropy[j] = ams[j].entropy
+    entropy = np.array(ams.entropy, dtype=np.float64)
 
     all_recalls = []
-    mismatches = 0
+    mismatches = all_mismatches[np.arange(len(tel)), tel].sum()
+    recognitions = all_mismatches <= ams.t
+    chosen = np.full(len(tel), metrics.no_label)
+
     # Recover memories
     for n, features, label in zip(range(len(tef_rounded)), tef_rounded, tel):
-        memories = []
-        recalls = {}
-
-        mismatches += ams[label].mismatches(features)
-        for k in ams:
-            recall = ams[k].recall(features)
-            recognized = not (ams[k].is_undefined(recall))
-
-            # For calculation of per memory precision and recall
-            if (k == label) and recognized:
-                cms[k][TP] += 1
-            elif k == label:
-                cms[k][FN] += 1
-            elif recognized:
-                cms[k][FP] += 1
-            else:
-                cms[k][TN] += 1
-
-            if recognized:
-                memories.append(k)
-                recalls[k] = recall
-
-        if (len(memories) == 0):
+        # Only the memory chosen among those that recognize the cue recalls it.
+        l, recall = ams.recall_best(features, recognitions[n])
+        if l is None:
             # Register empty case
-            undefined = np.full(domain, ams[0].undefined)
-            all_recalls.append((n, label, undefined))
-            cm[FN] += 1
+            all_recalls.append((n, label, recall))
         else:
-            l = get_label(memories, entropy)
-            features = recalls[l]*(max-min)*1.0/(msize-1) + min
+            chosen[n] = l
+            features = quantizer.dequantize(recall, msize)
             all_recalls.append((n, label, features))
 
-            if l == label:
-                cm[TP] += 1
-            else:
-                cm[FP] += 1
-
-    for i in range(n_mems):
-        positives = cms[i][TP] + cms[i][FP]
-        measures[constants.precision_idx, i] = cms[i][TP] / \
-            positives if positives else 1.0
-        measures[constants.recall_idx, i] = cms[i][TP] / \
-            (cms[i][TP] + cms[i][FN])
-
-    positives = cm[TP] + cm[FP]
-    total_precision = cm[TP] / positives if positives else 1.0
-    total_recall = cm[TP] / len(tef_rounded)
+    # Confusion matrix for calculating precision and recall per memory.
+    cms = metrics.confusion_matrices(recognitions, tel)
+    measures = metrics.memory_measures(cms)
+
+    total_precision, total_recall = metrics.total_measures(tel, chosen)
     return all_recalls, measures, entropy, total_precision, total_recall, mismatches
 
 
@@ -671,46 +547,68 @@ def get_stdev(d):
     return stdevs
 
 
-def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusion=None, bars_type=None, tolerance=0):
-    # Create the required associative memories.
-    ams = dict.fromkeys(range(n_memories))
-    for j in ams:
-        ams[j] = AssociativeMemory(domain, mem_size, tolerance)
+def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusion=None, bars_type=None, tolerances=(0, ),
+                        seed=None, quantization_mode='linear'):
+    # Create the required associative memories, keeping track of when
+    # each cell was marked so every filling step is evaluated at once.
+    ams = AssociativeMemoryBank(n_memories, domain, mem_size, timestamped=True)
 
     suffix = constants.filling_suffix
-    filling_features_filename = constants.features_name() + suffix
+    filling_features_prefix = constants.features_name() + suffix
     filling_features_filename = constants.data_filename(
-        filling_features_filename, fold)
+        filling_features_prefix, fold)
     filling_labels_filename = constants.labels_name + suffix
     filling_labels_filename = constants.data_filename(
         filling_labels_filename, fold)
 
     suffix = constants.testing_suffix
-    testing_features_filename = constants.features_name(
+    testing_features_prefix = constants.features_name(
         experiment, occlusion, bars_type) + suffix
     testing_features_filename = constants.data_filename(
-        testing_features_filename, fold)
+        testing_features_prefix, fold)
     testing_labels_filename = constants.labels_name + suffix
     testing_labels_filename = constants.data_filename(
         testing_labels_filename, fold)
 
-    filling_features = np.load(filling_features_filename)
-    filling_labels = np.load(filling_labels_filename)
-    testing_features = np.load(testing_features_filename)
-    testing_labels = np.load(testing_labels_filename)
-
-    filling_max = filling_features.max()
-    testing_max = testing_features.max()
-    fillin_min = filling_features.min()
-    testing_min = testing_features.min()
+    # Mapped, so folds running in parallel share the page cache.
+    filling_features = np.load(filling_features_filename, mmap_mode='r')
+    filling_labels = np.load(filling_labels_filename, mmap_mode='r')
+    testing_features = np.load(testing_features_filename, mmap_mode='r')
+    testing_labels = np.load(testing_labels_filename, mmap_mode='r')
 
-    maximum = filling_max if filling_max > testing_max else testing_max
-    minimum = fillin_min if fillin_min < testing_min else testing_min
+    quantizer = quantization.fitted(quantization_mode, filling_features, testing_features,
+                                    [mem_size], rounding=True)
 
     total = len(filling_features)
     percents = np.array(constants.memory_fills)
     steps = np.round(total*percents/100.0).astype(int)
 
+    filling_rounded = quantizer.cached(filling_features_prefix, fold, [mem_size])[mem_size]
+    testing_rounded = quantizer.cached(testing_features_prefix, fold, [mem_size])[mem_size]
+
+    # Registration, in the order of the filling steps.
+    ams.register_many(filling_rounded[:steps[-1]], filling_labels[:steps[-1]])
+    stage_mismatches = ams.mismatches_at(testing_rounded, steps)
+    snapshots = [ams.snapshot(k) for k in steps]
+
+    # Mismatches do not depend on the tolerance, so all tolerances are
+    # evaluated from the same ones. Each tolerance recalls with its own
+    # stream, keyed by the tolerance, whatever others are evaluated.
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    results = {}
+    for tolerance in tolerances:
+        rng = np.random.default_rng(np.random.SeedSequence(
+            seed.entropy, spawn_key=seed.spawn_key + (tolerance, )))
+        results[tolerance] = get_recalling_stages(snapshots, mem_size, domain, quantizer,
+                                                  testing_rounded, testing_labels, stage_mismatches, tolerance, fold,
+                                                  rng)
+
+    return fold, results
+
+
+def get_recalling_stages(snapshots, mem_size, domain, quantizer, testing_rounded, testing_labels,
+                         stage_mismatches, tolerance, fold, rng=None):
     stage_recalls = []
     stage_entropies = {}
     stage_mprecision = {}
@@ -719,14 +617,12 @@ def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusio
     total_recalls = []
     mismatches = []
 
-    i = 0
-    for j in range(len(steps)):
-        k = steps[j]
-        features = filling_features[i:k]
-        labels = filling_labels[i:k]
-
-        recalls, measures, entropies, total_precision, total_recall, mis_count = get_recalls(ams, mem_size, domain, minimum, maximum,
-                                                                                             features, labels, testing_features, testing_labels, fold)
+    for j, ams in enumerate(snapshots):
+        ams.t = tolerance
+        if rng is not None:
+            ams.rng = rng
+        recalls, measures, entropies, total_precision, total_recall, mis_count = get_recalls(ams, mem_size, domain, quantizer,
+                                                                                 testing_rounded, testing_labels, stage_mismatches[:, :, j], fold)
 
         # A list of tuples (position, label, features)
         stage_recalls += recalls
@@ -745,18 +641,40 @@ def test_recalling_fold(n_memories, mem_size, domain, fold, experiment, occlusio
         total_recalls.append(total_recall)
         total_precisions.append(total_precision)
 
-        i = k
-
         mismatches.append(mis_count)
 
-    return fold, stage_recalls, stage_entropies, stage_mprecision, \
+    return stage_recalls, stage_entropies, stage_mprecision, \
         stage_mrecall, np.array(total_precisions), np.array(
             total_recalls), np.array(mismatches)
 
 
-def test_recalling(domain, mem_size, experiment, occlusion=None, bars_type=None, tolerance=0):
+def test_recalling(domain, mem_size, experiment, occlusion=None, bars_type=None, tolerances=(0, ), seed=None,
+                   quantization_mode='linear'):
+    """ Runs the recalling experiment for all the tolerances given.
+
+    Features are loaded, and memories filled and queried, once per fold;
+    results are saved separately for each tolerance. Every fold, and
+    every tolerance within it, recalls with its own random stream spawned
+    from seed, so results only depend on the seed and not on how folds
+    are spread among processes or which other tolerances are run.
+    """
     n_memories = constants.n_labels
+    seeds = np.random.SeedSequence(seed).spawn(constants.training_stages)
+
+    list_results = Parallel(n_jobs=constants.n_jobs, verbose=50)(
+        delayed(test_recalling_fold)(n_memories, mem_size, domain,
+                                     fold, experiment, occlusion, bars_type, tolerances, seeds[fold],
+                                     quantization_mode)
+        for fold in range(constants.training_stages))
+
+    for tolerance in tolerances:
+        save_recalling([(fold, ) + results[tolerance] for fold, results in list_results],
+                       experiment, occlusion, bars_type, tolerance, quantization_mode)
+
+    print('Test completed')
+
 
+def save_recalling(list_results, experiment, occlusion=None, bars_type=None, tolerance=0, quantization_mode='linear'):
     all_recalls = {}
     all_entropies = {}
     all_mprecision = {}
@@ -769,10 +687,6 @@ def test_recalling(domain, mem_size, experiment, occlusion=None, bars_type=None,
         (constants.training_stages, len(constants.memory_fills)))
 
     xlabels = constants.memory_fills
-    list_results = Parallel(n_jobs=constants.n_jobs, verbose=50)(
-        delayed(test_recalling_fold)(n_memories, mem_size, domain,
-                                     fold, experiment, occlusion, bars_type, tolerance)
-        for fold in range(constants.training_stages))
 
     for fold, stage_recalls, stage_entropies, stage_mprecision, stage_mrecall,\
             total_precision, total_recall, mismatches in list_results:
@@ -799,7 +713,7 @@ def test_recalling(domain, mem_size, experiment, occlusion=None, bars_type=None,
         tags = np.array(tags)
         memories = np.array(memories)
         memories_filename = constants.memories_name(
-            experiment, occlusion, bars_type, tolerance)
+            experiment, occlusion, bars_type, tolerance, quantization_mode)
         memories_filename = constants.data_filename(memories_filename, fold)
         np.save(memories_filename, memories)
         tags_filename = constants.labels_name + constants.memory_suffix
@@ -813,38 +727,46 @@ def test_recalling(domain, mem_size, experiment, occlusion=None, bars_type=None,
     main_avrge_mrecall = get_means(all_mrecall)
     main_stdev_mrecall = get_stdev(all_mrecall)
 
-    np.savetxt(constants.csv_filename('main_average_precision', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_average_precision', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                main_avrge_mprecision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_average_recall', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_average_recall', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                main_avrge_mrecall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_average_entropy', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_average_entropy', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                main_avrge_entropies, delimiter=',')
 
-    np.savetxt(constants.csv_filename('main_stdev_precision', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_stdev_precision', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                main_stdev_mprecision, delimiter=',')
-    np.savetxt(constants.csv_filename('main_stdev_recall', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_stdev_recall', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                main_stdev_mrecall, delimiter=',')
-    np.savetxt(constants.csv_filename('main_stdev_entropy', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_stdev_entropy', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                main_stdev_entropies, delimiter=',')
-    np.savetxt(constants.csv_filename('main_total_recalls', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_total_recalls', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                total_recalls, delimiter=',')
-    np.savetxt(constants.csv_filename('main_total_mismatches', experiment, occlusion, bars_type, tolerance),
+    np.savetxt(constants.csv_filename('main_total_mismatches', experiment, occlusion, bars_type, tolerance,
+                                      quantization_mode),
                total_mismatches, delimiter=',')
 
     plot_pre_graph(main_avrge_mprecision*100, main_avrge_mrecall*100, main_avrge_entropies,
                    main_stdev_mprecision*100, main_stdev_mrecall *
                    100, main_stdev_entropies, 'recall-',
                    xlabels=xlabels, xtitle=_('Percentage of memory corpus'), action=experiment,
-                   occlusion=occlusion, bars_type=bars_type, tolerance=tolerance)
+                   occlusion=occlusion, bars_type=bars_type, tolerance=tolerance,
+                   quantization=quantization_mode)
 
     plot_pre_graph(np.average(total_precisions, axis=0)*100, np.average(total_recalls, axis=0)*100,
                    main_avrge_entropies, np.std(
                        total_precisions, axis=0)*100, np.std(total_recalls, axis=0)*100,
                    main_stdev_entropies, 'total_recall-',
                    xlabels=xlabels, xtitle=_('Percentage of memory corpus'), action=experiment,
-                   occlusion=occlusion, bars_type=bars_type, tolerance=tolerance)
-
-    print('Test completed')
+                   occlusion=occlusion, bars_type=bars_type, tolerance=tolerance,
+                   quantization=quantization_mode)
 
 
 def get_all_data(prefix, domain):
@@ -915,7 +837,7 @@ def save_history(history, prefix):
 ##############################################################################
 # Main section
 
-def main(action, occlusion=None, bar_type=None, tolerance=0):
+def main(action, occlusion=None, bar_type=None, tolerances=(0, ), seed=None, quantization_mode='linear'):
     """ Distributes work.
 
     The main function distributes work according to the options chosen in the
@@ -950,12 +872,13 @@ def main(action, occlusion=None, bar_type=None, tolerance=0):
         characterize_features(constants.domain, action)
     elif (action == constants.EXP_1) or (action == constants.EXP_2):
         # The domain size, equal to the size of the output layer of the network.
-        test_memories(constants.domain, action)
+        test_memories(constants.domain, action, quantization_mode)
     elif (action == constants.EXP_3):
         test_recalling(constants.domain,
-                       constants.partial_ideal_memory_size, action)
+                       constants.partial_ideal_memory_size, action, seed=seed,
+                       quantization_mode=quantization_mode)
     elif (action == constants.EXP_4):
-        convnet.remember(action)
+        convnet.remember(action, quantization_mode=quantization_mode)
     elif (constants.EXP_5 <= action) and (action <= constants.EXP_10):
         # Generates features for the data sections using the previously generate
         # neural network, introducing (background color) occlusion.
@@ -971,8 +894,9 @@ def main(action, occlusion=None, bar_type=None, tolerance=0):
         save_history(history, features_prefix)
         characterize_features(constants.domain, action, occlusion, bar_type)
         test_recalling(constants.domain, constants.partial_ideal_memory_size,
-                       action, occlusion, bar_type, tolerance)
-        convnet.remember(action, occlusion, bar_type, tolerance)
+                       action, occlusion, bar_type, tolerances, seed, quantization_mode)
+        for tolerance in tolerances:
+            convnet.remember(action, occlusion, bar_type, tolerance, quantization_mode)
 
 
 if __name__ == "__main__":
@@ -987,8 +911,13 @@ if __name__ == "__main__":
         description='Associative Memory Experimenter.')
     parser.add_argument('-l', nargs='?', dest='lang', choices=['en', 'es'], default='en',
                         help='choose between English (en) or Spanish (es) labels for graphs.')
-    parser.add_argument('-t', nargs='?', dest='tolerance', type=int,
-                        help='run the experiment with the tolerance given (only experiments 5 to 12).')
+    parser.add_argument('-t', nargs='+', dest='tolerances', type=int,
+                        help='run the experiment with the tolerances given, in a single pass (only experiments 5 to 12).')
+    parser.add_argument('-s', nargs='?', dest='seed', type=int,
+                        help='seed the random choices made when recalling, to make memories reproducible.')
+    parser.add_argument('-q', nargs='?', dest='quantization_mode', choices=quantization.modes, default='linear',
+                        help='quantize features in levels of equal width (linear) or holding equal parts '
+                        'of the filling corpus, per feature (quantile).')
 
     group = parser.add_mutually_exclusive_group(required=False)
     group.add_argument('-o', nargs='?', dest='occlusion', type=float,
@@ -1010,7 +939,9 @@ if __name__ == "__main__":
     lang = args.lang
     occlusion = args.occlusion
     bars_type = args.bars_type
-    tolerance = args.tolerance
+    tolerances = args.tolerances
+    seed = args.seed
+    quantization_mode = args.quantization_mode
     action = args.action
     nexp = args.nexp
 
@@ -1035,9 +966,9 @@ if __name__ == "__main__":
                         .format(constants.MAX_EXPERIMENT))
             exit(2)
 
-    if tolerance is None:
-        tolerance = 0
-    elif (tolerance < 0) or (constants.domain < tolerance):
+    if tolerances is None:
+        tolerances = [0]
+    elif any((tolerance < 0) or (constants.domain < tolerance) for tolerance in tolerances):
         print_error("tolerance needs to be a value between 0 and {0}."
                     .format(constants.domain))
         exit(3)
@@ -1051,7 +982,7 @@ if __name__ == "__main__":
             print_error("There are only {1} experiments available, numbered consecutively from {0}."
                         .format(constants.MIN_EXPERIMENT, constants.MAX_EXPERIMENT))
             exit(1)
-        main(nexp, occlusion, bars_type, tolerance)
+        main(nexp, occlusion, bars_type, tolerances, seed, quantization_mode)
     else:
         # Other action was chosen
-        main(action)
+        main(action, seed=seed, quantization_mode=quantization_mode)
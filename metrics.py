@@ -0,0 +1,100 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import numpy as np
+
+import constants
+
+# Indexes of the confusion matrix of a memory.
+TP = (0, 0)
+FP = (0, 1)
+FN = (1, 0)
+TN = (1, 1)
+
+# Label chosen for a cue no memory recognizes.
+no_label = -1
+
+
+def confusion_matrices(recognitions, correct):
+    """ Returns the (n_memories, 2, 2) confusion matrices of the memories.
+
+    recognitions is a (B, n_memories) boolean matrix telling which memories
+    recognize each cue, and correct holds the memory each cue belongs to.
+    """
+    n_cues, n_memories = recognitions.shape
+    correct = np.asarray(correct)
+    hits = recognitions[np.arange(n_cues), correct]
+
+    cms = np.zeros((n_memories, 2, 2))
+    cms[(slice(None), ) + TP] = np.bincount(correct[hits], minlength=n_memories)
+    cms[(slice(None), ) + FN] = np.bincount(correct[~hits], minlength=n_memories)
+    cms[(slice(None), ) + FP] = np.count_nonzero(recognitions, axis=0) - cms[(slice(None), ) + TP]
+    cms[(slice(None), ) + TN] = n_cues - cms.sum(axis=(1, 2))
+    return cms
+
+
+def memory_measures(cms):
+    """ Returns the precision and recall of every memory from its confusion matrix.
+
+    The precision of memories that never responded is 1.
+    """
+    tp = cms[(slice(None), ) + TP]
+    positives = tp + cms[(slice(None), ) + FP]
+
+    measures = np.zeros((constants.n_measures, len(cms)), dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        measures[constants.precision_idx] = np.where(positives == 0, 1.0, tp / positives)
+        measures[constants.recall_idx] = tp / (tp + cms[(slice(None), ) + FN])
+    return measures
+
+
+def behaviours(recognitions, correct, chosen):
+    """ Returns the behaviour counts and overall precision and recall.
+
+    chosen holds the memory chosen for each cue, or no_label.
+    """
+    n_cues = len(recognitions)
+    correct = np.asarray(correct)
+    responses = np.count_nonzero(recognitions, axis=1)
+    hits = recognitions[np.arange(n_cues), correct]
+    right = np.asarray(chosen) == correct
+
+    behaviour = np.zeros(constants.n_behaviours, dtype=np.float64)
+    behaviour[constants.no_response_idx] = np.count_nonzero(responses == 0)
+    behaviour[constants.no_correct_response_idx] = np.count_nonzero((responses > 0) & ~hits)
+    behaviour[constants.no_correct_chosen_idx] = np.count_nonzero(hits & ~right)
+    behaviour[constants.correct_response_idx] = np.count_nonzero(hits & right)
+    behaviour[constants.mean_responses_idx] = responses.mean()
+
+    all_responses = n_cues - behaviour[constants.no_response_idx]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        behaviour[constants.precision_idx] = \
+            behaviour[constants.correct_response_idx] / np.float64(all_responses)
+    behaviour[constants.recall_idx] = behaviour[constants.correct_response_idx] / n_cues
+    return behaviour
+
+
+def total_measures(correct, chosen):
+    """ Returns the overall precision and recall of the labels chosen for the cues.
+
+    Precision is 1 when no label was chosen at all.
+    """
+    chosen = np.asarray(chosen)
+    positives = np.count_nonzero(chosen != no_label)
+    true_positives = np.count_nonzero(chosen == np.asarray(correct))
+    total_precision = true_positives / positives if positives else 1.0
+    total_recall = true_positives / len(chosen)
+    return total_precision, total_recall
@@ -0,0 +1,237 @@
+# Copyright [2020] Luis Alberto Pineda Cortés, Gibrán Fuentes Pineda,
+# Rafael Morales Gamboa.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import tempfile
+import numpy as np
+
+import constants
+
+
+def code_dtype(msize):
+    """ Returns the smallest unsigned integer type holding codes for msize levels.
+    """
+    return np.min_scalar_type(max(msize - 1, 0))
+
+
+def _save(filename, **arrays):
+    """ Saves arrays as numpy.savez into a temporary file, then moves it to filename.
+    """
+    descriptor, temporary = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(filename))
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, filename)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+class _Quantization(object):
+    # What all quantizers share: codes for several sizes at once, and
+    # their cache. Subclasses give scheme, parameters, _prepared, _codes
+    # and dequantize.
+
+    def quantize(self, features, msizes):
+        """ Returns a dictionary with the codes of features for every size in msizes.
+
+        All sizes are computed in one pass through the features, by chunks
+        of rows, and each is stored with the smallest type that fits it.
+        """
+        codes = {msize: np.empty(features.shape, dtype=code_dtype(msize)) for msize in msizes}
+        for rows in constants.row_chunks(features):
+            prepared = self._prepared(features[rows])
+            for msize in msizes:
+                codes[msize][rows] = self._codes(prepared, msize)
+        return codes
+
+    def _cache_filename(self, prefix, fold, msize):
+        digest = hashlib.sha1(self.parameters(msize).tobytes()).hexdigest()[:12]
+        return constants.quantized_filename(prefix, fold, self.scheme, msize, digest)
+
+    def cached(self, prefix, fold, msizes):
+        """ Returns codes, as quantize, of the features saved as prefix for fold.
+
+        Codes are kept on disk, keyed by fold, scheme, size and a digest of
+        the parameters, so experiments quantizing the same features with
+        different bounds keep their own. They are reused while they are
+        newer than the features, and written whole, so processes running
+        at once never read a partial file.
+        """
+        source = constants.data_filename(prefix, fold)
+        codes = {}
+        missing = []
+        for msize in msizes:
+            filename = self._cache_filename(prefix, fold, msize)
+            if os.path.exists(filename) and os.path.getmtime(filename) >= os.path.getmtime(source):
+                with np.load(filename) as saved:
+                    if np.array_equal(saved['parameters'], self.parameters(msize)):
+                        codes[msize] = saved['codes']
+                        continue
+            missing.append(msize)
+
+        if missing:
+            new_codes = self.quantize(np.load(source, mmap_mode='r'), missing)
+            for msize in missing:
+                _save(self._cache_filename(prefix, fold, msize),
+                      codes=new_codes[msize], parameters=self.parameters(msize))
+            codes.update(new_codes)
+
+        return codes
+
+
+class Quantizer(_Quantization):
+    def __init__(self, min_value, max_value, rounding=False):
+        """
+        Maps features to the m levels (rows) of a memory, for any m.
+
+        Parameters
+        ----------
+        min_value, max_value : float
+            The bounds of the features.
+        rounding : bool
+            Round features to the nearest of m levels going from min_value
+            to max_value, as the recalling experiments do, instead of
+            flooring them into m levels of equal width, which nest: codes
+            for m are codes for m*k divided by k.
+        """
+        self.min_value = min_value
+        self.max_value = max_value
+        self.rounding = rounding
+
+    @classmethod
+    def fit(cls, *features, rounding=False):
+        """ A quantizer bounded by the minimum and maximum of all the features given.
+
+        Arrays are scanned by chunks, so they may be memory mapped.
+        """
+        min_value = min(f[rows].min() for f in features for rows in constants.row_chunks(f))
+        max_value = max(f[rows].max() for f in features for rows in constants.row_chunks(f))
+        return cls(min_value, max_value, rounding)
+
+    @property
+    def scheme(self):
+        """ Name of the quantization, used to key cached codes.
+        """
+        return 'rnd' if self.rounding else 'lin'
+
+    def parameters(self, msize):
+        """ Everything the codes for msize depend on, besides the features.
+        """
+        return np.array([self.min_value, self.max_value], dtype=np.float64)
+
+    def _prepared(self, features):
+        return features - self.min_value
+
+    def _codes(self, shifted, msize):
+        span = self.max_value - self.min_value
+        if self.rounding:
+            return np.round(shifted * (msize - 1) / span)
+        return np.minimum(np.floor(msize*shifted / span), msize - 1)
+
+    def dequantize(self, codes, msize):
+        """ Returns the features represented by codes for msize.
+
+        Rounded codes stand for their level, and floored ones for the
+        middle of their interval.
+        """
+        span = self.max_value - self.min_value
+        if self.rounding:
+            return codes*span*1.0/(msize - 1) + self.min_value
+        return (codes + 0.5)*span/msize + self.min_value
+
+
+class QuantileQuantizer(_Quantization):
+    def __init__(self, edges, centers):
+        """
+        Maps each feature to m levels holding equal parts of a corpus.
+
+        Parameters
+        ----------
+        edges : dict
+            For each memory size m, an (m-1, n) array with the quantiles
+            k/m, for k = 1..m-1, of every feature, so level k holds the
+            values between edges k-1 and k.
+        centers : dict
+            For each memory size m, an (m, n) array with the quantiles
+            (k+1/2)/m of every feature, which stand for the levels.
+        """
+        self.edges = edges
+        self.centers = centers
+
+    @classmethod
+    def fit(cls, features, msizes):
+        """ A quantizer for the sizes in msizes, splitting the features given in equal parts.
+
+        Levels nest as those of equal width do, since the quantiles for m
+        are among those for m*k.
+        """
+        probabilities = [np.arange(1, msize)/msize for msize in msizes] + \
+            [(np.arange(msize) + 0.5)/msize for msize in msizes]
+        # All quantiles at once, so the features are sorted only once.
+        quantiles = np.quantile(features, np.concatenate(probabilities), axis=0)
+        quantiles = np.split(quantiles, np.cumsum([len(p) for p in probabilities])[:-1])
+        edges = dict(zip(msizes, quantiles[:len(msizes)]))
+        centers = dict(zip(msizes, quantiles[len(msizes):]))
+        return cls(edges, centers)
+
+    @property
+    def scheme(self):
+        return 'qtl'
+
+    def parameters(self, msize):
+        return np.concatenate((self.edges[msize], self.centers[msize]), axis=None)
+
+    def _prepared(self, features):
+        # Features as rows, so each is searched contiguously for every size.
+        return np.ascontiguousarray(features.T)
+
+    def _codes(self, columns, msize):
+        # Each level is the number of edges at or below the value, found
+        # for all the rows of a chunk by one search per feature.
+        edges = self.edges[msize]
+        codes = np.empty(columns.shape, dtype=code_dtype(msize))
+        for i, values in enumerate(columns):
+            codes[i] = np.searchsorted(edges[:, i], values, side='right')
+        return codes.T
+
+    def dequantize(self, codes, msize):
+        """ Returns the features represented by codes for msize, undefined codes staying so.
+        """
+        codes = np.asarray(codes, dtype=float)
+        features = np.full(codes.shape, np.nan)
+        defined = ~np.isnan(codes)
+        columns = np.broadcast_to(np.arange(codes.shape[-1]), codes.shape)
+        features[defined] = self.centers[msize][codes[defined].astype(int), columns[defined]]
+        return features
+
+
+# Quantizations selectable in the experiments.
+modes = ('linear', 'quantile')
+
+
+def fitted(mode, filling_features, testing_features, msizes, rounding=False):
+    """ Returns a quantizer of the given mode for the features of a fold.
+
+    Linear quantizers are bounded by all the features, and round if asked
+    to. Quantile ones split the filling features only, and have no
+    rounding: their codes always stand for the centers of their levels.
+    """
+    if mode == 'quantile':
+        return QuantileQuantizer.fit(filling_features, msizes)
+    elif mode == 'linear':
+        return Quantizer.fit(filling_features, testing_features, rounding=rounding)
+    raise ValueError('Unknown quantization mode', mode)